@@ -14,6 +14,9 @@ from src.data.API.pipeline import main as data_pipeline_main
 from src.data.analysis import main as chart_data_main
 from src.model.train_lstm import run as train_lstm_main
 from src.model.analysis import main as analyze_model_main
+from src.model.tuning import run as tune_models_main
+from src.model.clustering import run as train_clusters_main
+from src.dag import run as run_dag
 
 def clear_screen():
     """Clear the console screen."""
@@ -35,8 +38,10 @@ def print_menu():
     print("2. Chart data")
     print("3. Train model")
     print("4. Analyze model")
-    print("5. Exit")
-    print("\nEnter your choice (1-5): ", end="")
+    print("5. Tune hyperparameters")
+    print("6. Train clustered models")
+    print("7. Exit")
+    print("\nEnter your choice (1-7): ", end="")
 
 def check_data_updates():
     """Run the data pipeline to check for updates."""
@@ -62,6 +67,18 @@ def analyze_model():
     analyze_model_main()
     input("\nPress Enter to continue...")
 
+def tune_models():
+    """Run the hyperparameter search for untuned tickers."""
+    print("\n[1/1] Tuning LSTM hyperparameters...")
+    tune_models_main()
+    input("\nPress Enter to continue...")
+
+def train_clusters():
+    """Cluster similar tickers and train one shared model per cluster."""
+    print("\n[1/1] Clustering tickers and training cluster models...")
+    train_clusters_main()
+    input("\nPress Enter to continue...")
+
 def main():
     """Main function to run the interactive menu."""
     while True:
@@ -79,11 +96,25 @@ def main():
         elif choice == '4':
             analyze_model()
         elif choice == '5':
+            tune_models()
+        elif choice == '6':
+            train_clusters()
+        elif choice == '7':
             print("\nExiting the application. Goodbye!")
             sys.exit(0)
         else:
-            print("\nInvalid choice. Please enter a number between 1 and 5.")
+            print("\nInvalid choice. Please enter a number between 1 and 7.")
             time.sleep(2)
 
 if __name__ == "__main__":
+    # `python run.py all` (or stage names, e.g. `python run.py validate figures`) runs the
+    # pipeline DAG non-interactively, redoing only stages whose inputs changed
+    if len(sys.argv) > 1:
+        targets = None if sys.argv[1:] == ['all'] else sys.argv[1:]
+        try:
+            status = run_dag(targets)
+        except ValueError as e:
+            print(e)
+            sys.exit(2)
+        sys.exit(1 if any(result in ('failed', 'blocked') for result in status.values()) else 0)
     main()
\ No newline at end of file
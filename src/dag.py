@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import date
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+"""
+Pipeline DAG runner: each stage declares the files it reads and writes.
+A stage is skipped when the content fingerprint of its inputs (plus any extra key,
+e.g. today's date for ingest) matches the last successful run and its outputs still exist.
+Stages whose dependencies are done run concurrently.
+"""
+
+# Configuration
+STATE_PATH = "bin/dag_state.json"
+RAW_PATH = "bin/data/stock_data.csv"          # pipeline.RAW_FILE
+VALIDATED_PATH = "bin/data/validated.csv"     # pipeline.VALIDATED_FILE
+QUARANTINE_PATH = "bin/data/quarantine.csv"
+FEATURES_PATH = "bin/data/features.csv"
+AGGREGATES_DIR = "bin/data/aggregates"
+WINDOWS_DIR = "bin/data/windows"
+BEST_PARAMS_PATH = "models/best_params.json"
+ROUTING_PATH = "models/routing.json"
+REGISTRY_PATH = "models/registry.json"
+PERFORMANCE_PATH = "results/model_performance.csv"
+FIGS_DIR = "bin/data/figs"
+
+
+class Stage:
+    """One pipeline step. `key` is an optional callable whose value also invalidates the stage."""
+
+    def __init__(self, name, func, inputs=(), outputs=(), deps=(), key=None, lock=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.key = key
+        self.lock = lock  # Stages sharing a lock name never run at the same time
+
+
+def _files(path):
+    path = Path(path)
+    if path.is_dir():
+        return sorted(p for p in path.rglob('*') if p.is_file())
+    return [path] if path.exists() else []
+
+
+class Fingerprinter:
+    """Content hashes of files and directories, re-hashing only files whose size or mtime changed."""
+
+    def __init__(self, cache, lock):
+        self.cache = cache
+        self._lock = lock  # Shared with whoever serializes the cache
+
+    def file_hash(self, path):
+        stat = path.stat()
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            cached = self.cache.get(str(path))
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        with self._lock:
+            self.cache[str(path)] = [stamp, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def paths(self, paths, extra=None):
+        digest = hashlib.sha256(json.dumps(extra, default=str).encode())
+        for path in paths:
+            digest.update(str(path).encode())
+            for file in _files(path):
+                digest.update(str(file).encode())
+                digest.update(self.file_hash(file).encode())
+        return digest.hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _required(stages, targets):
+    """The target stages plus everything they depend on."""
+    by_name = {s.name: s for s in stages}
+    unknown = [name for name in targets if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)}. Valid stages: {', '.join(by_name)}, or 'all'")
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].deps)
+    return [s for s in stages if s.name in needed]
+
+
+def run_dag(stages, targets=None, max_workers=4, state_path=STATE_PATH):
+    """Run the stages needed for `targets` (default: all), skipping up-to-date ones. Returns {stage: status}."""
+    stages = _required(stages, targets or [s.name for s in stages])
+    state = load_state(state_path)
+    state_lock = threading.Lock()
+    fingerprints = Fingerprinter(state.setdefault('files', {}), state_lock)
+    locks = {s.lock: threading.Lock() for s in stages if s.lock}
+    status = {}
+
+    def execute(stage):
+        key = stage.key() if stage.key else None
+        input_fp = fingerprints.paths(stage.inputs, key)
+        previous = state['stages'].get(stage.name, {})
+        if previous.get('inputs') == input_fp and all(_files(p) for p in stage.outputs):
+            return 'skipped'
+
+        print(f"\n>>> {stage.name}")
+        if stage.lock:
+            with locks[stage.lock]:
+                ok = stage.func() is not False
+        else:
+            ok = stage.func() is not False
+        if not ok:
+            return 'failed'
+        with state_lock:
+            state['stages'][stage.name] = {'inputs': input_fp}
+            save_state(state, state_path)
+        return 'ran'
+
+    pending = {s.name: s for s in stages}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(status.get(dep) == 'failed' or status.get(dep) == 'blocked' for dep in stage.deps):
+                    status[name] = 'blocked'
+                    del pending[name]
+                elif all(dep in status for dep in stage.deps):
+                    running[executor.submit(execute, stage)] = name
+                    del pending[name]
+            if not running:
+                if pending:
+                    raise ValueError(f"Unresolvable stage dependencies: {sorted(pending)}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status[name] = future.result()
+                except Exception as e:
+                    print(f"Error in stage {name}: {e}")
+                    status[name] = 'failed'
+
+    for name, result in status.items():
+        print(f"{'✓' if result in ('ran', 'skipped') else '✗'} {name}: {result}")
+    return status
+
+
+def default_stages():
+    """
+    ingest -> validate -> windows -> train -> evaluate, with features -> figures alongside.
+    Once `models/routing.json` exists (menu: Train clustered models), routed tickers are trained
+    as one model per cluster and only unrouted tickers get windows and a model of their own.
+    """
+    import pandas as pd
+    from src.data.API import pipeline
+    from src.data.analysis import main as chart_data_main
+    from src.model import train_lstm, analysis, clustering
+    from src.model.tuning import load_best_params
+
+    def ingest_key():
+        # Sources are refreshed at most once per day, or when their configuration changes
+        return {'day': date.today().isoformat(), 'sources': pipeline.load_config().get('sources')}
+
+    def validate():
+        pipeline.run_validation(RAW_PATH, QUARANTINE_PATH, VALIDATED_PATH)
+
+    def windows():
+        data = pd.read_csv(VALIDATED_PATH)
+        routed = data['Ticker'].isin(clustering.load_routing(ROUTING_PATH))
+        train_lstm.build_windows(data[~routed], load_best_params(), WINDOWS_DIR)
+
+    def train():
+        routing = clustering.load_routing(ROUTING_PATH)
+        if routing:
+            # Clusters were tuned when they were formed, so the daily run only retrains them
+            clustering.train_clusters(pd.read_csv(VALIDATED_PATH), routing, tune=False)
+        train_lstm.run(windows_dir=WINDOWS_DIR)
+
+    return [
+        Stage('ingest', lambda: pipeline.ingest(), outputs=[RAW_PATH], key=ingest_key),
+        Stage('validate', validate, inputs=[RAW_PATH], outputs=[VALIDATED_PATH, QUARANTINE_PATH], deps=['ingest']),
+        Stage('features', lambda: pipeline.run_features(VALIDATED_PATH, FEATURES_PATH),
+              inputs=[VALIDATED_PATH], outputs=[FEATURES_PATH, AGGREGATES_DIR], deps=['validate']),
+        Stage('windows', windows, inputs=[VALIDATED_PATH, BEST_PARAMS_PATH, ROUTING_PATH], outputs=[WINDOWS_DIR],
+              deps=['validate']),
+        Stage('train', train, inputs=[WINDOWS_DIR, VALIDATED_PATH, BEST_PARAMS_PATH, ROUTING_PATH],
+              outputs=[REGISTRY_PATH], deps=['windows']),
+        Stage('evaluate', lambda: analysis.main(VALIDATED_PATH),
+              inputs=[VALIDATED_PATH, REGISTRY_PATH, ROUTING_PATH], outputs=[PERFORMANCE_PATH],
+              deps=['train'], lock='matplotlib'),
+        Stage('figures', lambda: chart_data_main(FEATURES_PATH, Path(VALIDATED_PATH).stem),
+              inputs=[FEATURES_PATH, AGGREGATES_DIR], outputs=[FIGS_DIR], deps=['features'], lock='matplotlib'),
+    ]
+
+
+def run(targets=None):
+    """Run the default pipeline up to `targets` (stage names), doing only the stale work."""
+    return run_dag(default_stages(), targets)
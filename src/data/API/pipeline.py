@@ -1,14 +1,17 @@
 import os
-import kagglehub
 from pathlib import Path
 import pandas as pd
 import json
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 from datetime import timedelta
+from src.data.API.sources import acquire, sources_from_config
+from src.data.aggregates import DIMENSIONS, trading_day, update_all, add_aggregate_features
 """NOT YET WORKING, PURELY TO FORMAT INPUT DATA FOR LSTM""" 
 # Configuration file in project root
 CONFIG_FILE = "config.json"
+RAW_FILE = "bin/data/stock_data.csv"
+VALIDATED_FILE = "bin/data/validated.csv"  # Clean rows; the raw store is never rewritten by validation
 
 def save_last_n_days_to_csv(file_path, n):
     """Load CSV, filter last n days, and overwrite the file."""
@@ -36,11 +39,20 @@ def load_config():
         "kaggle": {},
         "paths": {
             "data_dir": "bin/data",
-            "output_file": "bin/data/stock_data.csv"
+            "output_file": "bin/data/stock_data.csv",
+            "quarantine_file": "bin/data/quarantine.csv"
         },
         "dataset": {
             "id": "nelgiriyewithana/world-stock-prices-daily-updating",
+            "file_name": "World-Stock-Prices-Dataset.csv",
             "version": None  # Placeholder for dataset version
+        },
+        "sources": {
+            "kaggle": True,
+            "yfinance": {"tickers": [], "period": "1y"},
+            "mirror": {"dir": None},  # Local directory of CSVs for offline runs
+            "max_concurrency": 8,
+            "retries": 3
         }
     }
     
@@ -83,63 +95,142 @@ def setup_kaggle_auth():
     print("✓ Kaggle credentials saved. Ensure Proper setup in ~/config")
     return True
 
-def download_and_save_dataset(dataset_id, file_name):
-    """Download dataset and save to configured location"""
-    config = load_config()
-    
-    # Get paths from config
-    output_file = config['paths']['output_file']
-    
-    # Create directories if they don't exist
-    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
-    
-    try:
-        # Download the dataset without specifying a path
-        download_path = kagglehub.dataset_download(
-            dataset_id,
-            force_download=True
-        )
-        
-        print(f"✓ Dataset downloaded to: {download_path}")
-        
-        # Load the downloaded file into a DataFrame
-        try:
-            df = pd.read_csv(Path(download_path) / file_name)
-            
-            print(f"Saving dataset to: {output_file}")  # Debugging line
-            df.to_csv(output_file, index=False)
-            print(f"✓ Dataset processed and saved to: {output_file}")
-        except FileNotFoundError:
-            print(f"Warning: Could not find {file_name} in the downloaded dataset.")
-            print(f"Available files: {os.listdir(download_path)}")
-            return False
-        
-        return True
-    except Exception as e:
-        print(f"Error downloading or processing dataset: {e}")
-        print(f"Exception details: {type(e).__name__}: {str(e)}")
-        return False
-
 def load_data(file):
     data = pd.read_csv(file)
-    data = pd.DataFrame(data)
-    data['Date'] = pd.to_datetime(data['Date'], utc=True)
-
-    # Print the columns to check for 'Stock'
-    print("Data loaded:", data.head())  # Print the first few rows of the data
-    print("Columns in DataFrame:", data.columns)  # Print the columns to check for 'Stock'
-
     # Strip whitespace from column names
     data.columns = data.columns.str.strip()
+    # Unparseable dates become NaT and are reported by validate_data
+    data['Date'] = pd.to_datetime(data['Date'], errors='coerce', utc=True)
+    return data
+
+def adjust_for_splits(data, tolerance=0.25):
+    """
+    Back-adjust prices and volume for stock splits, vectorized over all tickers.
+    A split is only applied when the price actually jumps by its ratio across the split day,
+    so rows the source already adjusted are left alone.
+    Expects data sorted by Ticker, Date.
+    """
+    splits = data['Stock Splits'].fillna(0).astype(float)
+    prev_close = data.groupby('Ticker')['Close'].shift(1)
+    observed = prev_close / data['Close']
+    unadjusted = (splits > 0) & ((observed / splits.where(splits > 0) - 1).abs() < tolerance)
+    factor = splits.where(unadjusted, 1.0)
+
+    # Product of the factors of all strictly later rows of the same ticker
+    later = factor[::-1].groupby(data['Ticker'][::-1]).cumprod()[::-1] / factor
+    data = data.copy()
+    for col in ['Open', 'High', 'Low', 'Close']:
+        data[col] = data[col] / later
+    data['Volume'] = data['Volume'] * later
+    return data, int(unadjusted.sum())
+
+def validate_data(data, max_gap_days=10, max_jump=0.5):
+    """
+    Run all data-quality checks over the whole frame in one vectorized pass.
+    Duplicate (Ticker, trading day) rows and rows without a date are dropped; tickers with
+    non-positive prices, gaps longer than `max_gap_days` or unexplained daily moves
+    above `max_jump` are quarantined.
+    Returns (clean, quarantined, report) where report counts each check.
+    """
+    data = data.sort_values(['Ticker', 'Date'], kind='mergesort').reset_index(drop=True)
+    price_cols = ['Open', 'High', 'Low', 'Close']
+
+    missing_date = data['Date'].isna() | data['Ticker'].isna()
+    # Same session stamped at different times of day (e.g. naive vs exchange-local dates) is a duplicate
+    day = trading_day(data['Date'])
+    duplicate = data[['Ticker']].assign(Day=day).duplicated(keep='last') & ~missing_date
+    data = data[~missing_date & ~duplicate].reset_index(drop=True)
+
+    data, splits_applied = adjust_for_splits(data)
+
+    by_ticker = data.groupby('Ticker')
+    non_positive = (data[price_cols] <= 0).any(axis=1) | data['Close'].isna()
+    bad_range = data['High'] < data['Low']
+    gap = by_ticker['Date'].diff() > pd.Timedelta(days=max_gap_days)
+    price_ratio = data['Close'] / by_ticker['Close'].shift(1)
+    log_return = np.log(price_ratio.where(price_ratio > 0))
+    jump = log_return.abs() > np.log1p(max_jump)
+
+    checks = pd.DataFrame({
+        'non_positive_price': non_positive,
+        'high_below_low': bad_range,
+        'gap': gap,
+        'price_jump': jump,
+    })
+    failing = checks.any(axis=1).groupby(data['Ticker']).any()
+    quarantined_tickers = failing[failing].index
+    in_quarantine = data['Ticker'].isin(quarantined_tickers)
+
+    report = {
+        'rows': int(len(data)),
+        'tickers': int(data['Ticker'].nunique()),
+        'missing_date': int(missing_date.sum()),
+        'duplicate': int(duplicate.sum()),
+        'splits_adjusted': splits_applied,
+        **{name: int(flags.sum()) for name, flags in checks.items()},
+        'quarantined_tickers': sorted(quarantined_tickers),
+    }
+    return data[~in_quarantine].reset_index(drop=True), data[in_quarantine].reset_index(drop=True), report
+
+def print_validation_report(report):
+    """Print a compact summary of validate_data results."""
+    print(f"Validated {report['rows']} rows across {report['tickers']} tickers")
+    counts = {k: v for k, v in report.items() if k not in ('rows', 'tickers', 'quarantined_tickers')}
+    print("  " + ", ".join(f"{name}: {count}" for name, count in counts.items()))
+    if report['quarantined_tickers']:
+        print(f"  Quarantined ({len(report['quarantined_tickers'])}): {', '.join(report['quarantined_tickers'])}")
+    else:
+        print("  ✓ No tickers quarantined")
 
+def run_validation(file_path, quarantine_path, output_path=VALIDATED_FILE):
+    """
+    Validate `file_path`, writing clean rows to `output_path` and quarantined tickers to `quarantine_path`.
+    The input is left untouched, so both outputs can be rebuilt from it on every run.
+    """
+    clean, quarantined, report = validate_data(load_data(file_path))
+    print_validation_report(report)
 
+    Path(quarantine_path).parent.mkdir(parents=True, exist_ok=True)
+    quarantined.to_csv(quarantine_path, index=False)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    clean.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    return clean, report
+
+def training_data_path(raw_path=RAW_FILE, validated_path=VALIDATED_FILE):
+    """The data models should read: the validated file, or the raw store if validation has never run."""
+    if Path(validated_path).exists():
+        return validated_path
+    print(f"Warning: {validated_path} not found, reading unvalidated {raw_path} (run a data update first)")
+    return raw_path
+
+def build_features(data, window=20):
+    """Add per-ticker return, log return, rolling volatility and volume MA columns in one grouped pass."""
+    data = data.sort_values(['Ticker', 'Date'], kind='mergesort').reset_index(drop=True)
+    by_ticker = data.groupby('Ticker')
+    data['Return'] = by_ticker['Close'].pct_change()
+    data['Log_Return'] = np.log1p(data['Return'])
+    data[f'Volatility_{window}'] = data.groupby('Ticker')['Return'].transform(lambda r: r.rolling(window).std())
+    data[f'Volume_MA{window}'] = by_ticker['Volume'].transform(lambda v: v.rolling(window).mean())
     return data
 
-def replace_Industry_Tag_with_sector(data):
-    industry_tag = data['Industry_Tag'].unique()
-    print("Unique Industry Tags:", industry_tag)
-    # Replace 'Industry_Tag' with 'Sector'
-    
+def run_features(input_path, output_path):
+    """
+    Build the feature table from validated data and write it atomically.
+    Sector and country index return/volatility come from the incrementally cached aggregates.
+    """
+    data = build_features(load_data(input_path))
+    tables = update_all(data, source=Path(input_path).stem)
+    for by in DIMENSIONS:
+        if (by, 'equal') in tables:
+            data = add_aggregate_features(data, tables[(by, 'equal')], by)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    data.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    print(f"✓ Features for {data['Ticker'].nunique()} tickers saved to {output_path}")
+    return data
 
 def prepare_data(data):
     """Prepare the data for LSTM model with multiple stocks."""
@@ -171,29 +262,43 @@ def prepare_data(data):
 
     return np.array(X), np.array(y), scalers
 
+def ingest(config=None):
+    """Authenticate if needed, acquire all configured sources into the store and trim it. Returns success."""
+    config = config or load_config()
+    sources = sources_from_config(config)
+
+    print("\n[1/3] Setting up Kaggle authentication...")
+    if any(source.name == "kaggle" for source in sources) and not setup_kaggle_auth():
+        print("Failed to set up Kaggle authentication. Exiting.")
+        return False
+
+    print("\n[2/3] Acquiring data from: " + ", ".join(source.name for source in sources))
+    if not sources:
+        print("No data sources configured. Exiting.")
+        return False
+    sources_cfg = config.get('sources', {})
+    merged = acquire(sources, config['paths']['output_file'],
+                     max_concurrency=sources_cfg.get('max_concurrency', 8),
+                     retries=sources_cfg.get('retries', 3))
+    if merged.empty:
+        print("Failed to acquire any data. Exiting.")
+        return False
+
+    save_last_n_days_to_csv(config['paths']['output_file'], 180)
+    return True
+
 def main():
     """Main function to run the data pipeline."""
     print("=== Stock Market Data Pipeline ===")
-    
-    print("\n[1/2] Setting up Kaggle authentication...")
-    if not setup_kaggle_auth():
-        print("Failed to set up Kaggle authentication. Exiting.")
-        return
-    
-    print("\n[2/2] Downloading and saving dataset...")
-    dataset_id = "nelgiriyewithana/world-stock-prices-daily-updating"
-    file_name = "World-Stock-Prices-Dataset.csv"
-    if not download_and_save_dataset(dataset_id, file_name):
-        print("Failed to download and save dataset. Exiting.")
-        return
-
     config = load_config()
+    if not ingest(config):
+        return
     output_path = config['paths']['output_file']
-    
-    save_last_n_days_to_csv(output_path, 180)
 
-    data = load_data(output_path)
-                
+    print("\n[3/3] Validating data...")
+    quarantine_path = config['paths'].get('quarantine_file', "bin/data/quarantine.csv")
+    data, report = run_validation(output_path, quarantine_path, VALIDATED_FILE)
+
     print("\n=== Pipeline completed successfully ===")
 
 
@@ -0,0 +1,198 @@
+import os
+import asyncio
+from pathlib import Path
+
+import pandas as pd
+
+from src.data.aggregates import trading_day
+
+"""Async data acquisition: pluggable sources that merge into the local store."""
+
+# Columns of the Kaggle world-stock-prices dataset, used as the store schema
+STORE_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Brand_Name',
+                 'Ticker', 'Industry_Tag', 'Country', 'Dividends', 'Stock Splits',
+                 'Capital Gains']
+# Per-ticker metadata that per-ticker feeds (yfinance, mirror files) do not carry
+META_COLUMNS = ['Brand_Name', 'Industry_Tag', 'Country']
+KEY_COLUMNS = ['Ticker', 'Date']
+
+
+async def with_retries(func, *args, retries=3, backoff=1.0, label=""):
+    """Run a blocking call in a worker thread, retrying with exponential backoff."""
+    for attempt in range(1, retries + 1):
+        try:
+            return await asyncio.to_thread(func, *args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"Retry {attempt}/{retries - 1} for {label or func.__name__} in {delay:.1f}s ({type(e).__name__}: {e})")
+            await asyncio.sleep(delay)
+
+
+class DataSource:
+    """
+    Base class for acquisition sources.
+    A source splits its work into `units` (a whole dataset, one ticker, one file)
+    and `fetch_unit` loads one of them as a blocking call; the runner overlaps units.
+    """
+    name = "source"
+
+    def units(self):
+        return [None]
+
+    def fetch_unit(self, unit):
+        raise NotImplementedError
+
+    async def fetch(self, semaphore, retries=3, backoff=1.0):
+        """Fetch every unit concurrently (bounded by `semaphore`), normalize each, and concatenate them."""
+        async def run_unit(unit):
+            async with semaphore:
+                label = f"{self.name}:{unit}" if unit is not None else self.name
+                try:
+                    frame = await with_retries(self.fetch_unit, unit, retries=retries,
+                                               backoff=backoff, label=label)
+                except Exception as e:
+                    print(f"Warning: {label} failed after {retries} attempts: {e}")
+                    return None
+                # Per unit, so each file's date format is inferred on its own
+                return None if frame is None else normalize_frame(frame, label)
+
+        frames = await asyncio.gather(*(run_unit(unit) for unit in self.units()))
+        frames = [f for f in frames if f is not None and not f.empty]
+        if not frames:
+            return pd.DataFrame(columns=STORE_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+class KaggleSource(DataSource):
+    """The full Kaggle world-stock-prices dataset, downloaded through kagglehub."""
+    name = "kaggle"
+
+    def __init__(self, dataset_id, file_name):
+        self.dataset_id = dataset_id
+        self.file_name = file_name
+
+    def fetch_unit(self, unit):
+        import kagglehub
+
+        download_path = kagglehub.dataset_download(self.dataset_id, force_download=True)
+        print(f"✓ Dataset downloaded to: {download_path}")
+        csv_path = Path(download_path) / self.file_name
+        if not csv_path.exists():
+            raise FileNotFoundError(f"{self.file_name} not in download, available: {os.listdir(download_path)}")
+        return pd.read_csv(csv_path)
+
+
+class YFinanceSource(DataSource):
+    """Per-ticker daily history from yfinance, one request per ticker."""
+    name = "yfinance"
+
+    def __init__(self, tickers, period="1y"):
+        self.tickers = list(tickers)
+        self.period = period
+
+    def units(self):
+        return self.tickers
+
+    def fetch_unit(self, ticker):
+        import yfinance as yf
+
+        hist = yf.Ticker(ticker).history(period=self.period, auto_adjust=False, actions=True)
+        if hist.empty:
+            return None
+        hist = hist.reset_index()
+        hist['Ticker'] = ticker
+        return hist
+
+
+class LocalMirrorSource(DataSource):
+    """CSV files in a local directory (one per ticker or whole-dataset dumps), for offline runs."""
+    name = "mirror"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def units(self):
+        return sorted(self.directory.glob("*.csv"))
+
+    def fetch_unit(self, path):
+        df = pd.read_csv(path)
+        if 'Ticker' not in df.columns:
+            # Per-ticker files are named after the ticker
+            df['Ticker'] = Path(path).stem
+        return df
+
+
+def normalize_frame(df, label="store"):
+    """Coerce a source frame to the store schema with UTC dates, reporting rows dropped for a missing key."""
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce', utc=True)
+    for col in STORE_COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.NA
+    missing = df[KEY_COLUMNS].isna().any(axis=1)
+    if missing.any():
+        print(f"Warning: {label}: dropped {int(missing.sum())} of {len(df)} rows with no parseable Date or Ticker")
+    return df.loc[~missing, STORE_COLUMNS]
+
+
+def merge_into_store(frames, store_path):
+    """
+    Merge fetched frames into the CSV store, newest source winning on (Ticker, trading day).
+    Keying on the day rather than the timestamp matches naive mirror dates (00:00 UTC)
+    with the exchange-midnight timestamps of Kaggle and yfinance rows for the same session.
+    Metadata missing from per-ticker feeds is filled from the existing store.
+    The store is replaced atomically so a failed run never leaves a partial file.
+    """
+    store_path = Path(store_path)
+    parts = []
+    if store_path.exists():
+        parts.append(normalize_frame(pd.read_csv(store_path)))
+    # Source frames arrive already normalized per unit by DataSource.fetch
+    parts.extend(f for f in frames if f is not None and not f.empty)
+    if not parts:
+        return pd.DataFrame(columns=STORE_COLUMNS)
+
+    merged = pd.concat(parts, ignore_index=True)
+    merged = merged[~merged[['Ticker']].assign(Day=trading_day(merged['Date'])).duplicated(keep='last')]
+    merged = merged.sort_values(KEY_COLUMNS).reset_index(drop=True)
+    merged[META_COLUMNS] = merged.groupby('Ticker')[META_COLUMNS].transform(lambda s: s.ffill().bfill())
+
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = store_path.with_suffix(store_path.suffix + ".tmp")
+    merged.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, store_path)
+    return merged
+
+
+async def acquire_async(sources, store_path, max_concurrency=8, retries=3, backoff=1.0):
+    """Fetch all sources concurrently under one shared concurrency limit, then merge them in order."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    frames = await asyncio.gather(*(s.fetch(semaphore, retries=retries, backoff=backoff) for s in sources))
+    for source, frame in zip(sources, frames):
+        print(f"✓ {source.name}: {len(frame)} rows, {frame['Ticker'].nunique() if len(frame) else 0} tickers")
+    return merge_into_store(frames, store_path)
+
+
+def acquire(sources, store_path, max_concurrency=8, retries=3, backoff=1.0):
+    """Blocking entry point for `acquire_async`."""
+    return asyncio.run(acquire_async(sources, store_path, max_concurrency, retries, backoff))
+
+
+def sources_from_config(config):
+    """Build the source list from the `sources` section of config.json."""
+    sources_cfg = config.get('sources', {})
+    dataset = config.get('dataset', {})
+    sources = []
+    if sources_cfg.get('kaggle', True):
+        sources.append(KaggleSource(dataset.get('id', "nelgiriyewithana/world-stock-prices-daily-updating"),
+                                    dataset.get('file_name', "World-Stock-Prices-Dataset.csv")))
+    yf_cfg = sources_cfg.get('yfinance', {})
+    if yf_cfg.get('tickers'):
+        sources.append(YFinanceSource(yf_cfg['tickers'], yf_cfg.get('period', "1y")))
+    mirror_dir = sources_cfg.get('mirror', {}).get('dir')
+    if mirror_dir and Path(mirror_dir).is_dir():
+        sources.append(LocalMirrorSource(mirror_dir))
+    return sources
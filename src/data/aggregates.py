@@ -0,0 +1,169 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+"""
+Sector / country aggregation engine.
+Builds equal- or volume-weighted group indices (return, index level, rolling volatility)
+for every date in one grouped pass and caches them per input source. Each cached (group, day)
+row keeps a hash of the ticker rows it was built from, so an update recomputes from the first
+day whose inputs changed (late rows, quarantined tickers, back-adjusted prices) plus any new days.
+"""
+
+# Configuration
+CACHE_DIR = Path("bin/data/aggregates")
+DIMENSIONS = ['Industry_Tag', 'Country']
+WEIGHTINGS = ['equal', 'volume']
+VOL_WINDOW = 20
+AGG_COLUMNS = ['Day', 'Group', 'Return', 'Index', 'Volatility', 'Tickers', 'Dollar_Volume', 'Input_Hash']
+
+
+def trading_day(dates):
+    """
+    Calendar trading day of each timestamp.
+    Dates are stored in UTC but stamped at local midnight, so rounding to the nearest day
+    recovers the exchange's own date for offsets within +/-12h (US and Asian tickers line up).
+    """
+    return pd.to_datetime(dates, utc=True).dt.round('D').dt.tz_localize(None)
+
+
+def ticker_returns(data):
+    """Daily return, weight inputs and trading day per row, computed once for all tickers."""
+    df = data[['Date', 'Ticker', 'Close', 'Volume'] + [d for d in DIMENSIONS if d in data.columns]].copy()
+    df['Day'] = trading_day(df['Date'])
+    df = df.sort_values(['Ticker', 'Day'], kind='mergesort')
+    df['Return'] = df.groupby('Ticker')['Close'].pct_change()
+    df['Dollar_Volume'] = df['Close'] * df['Volume']
+    return df
+
+
+def group_day_hashes(df, by):
+    """Order-independent hash of the ticker rows behind each (group, day), as hex strings."""
+    rows = df.dropna(subset=['Return', by])
+    row_hash = pd.util.hash_pandas_object(rows[['Ticker', 'Close', 'Volume', 'Return']], index=False)
+    # uint64 sums wrap around, which keeps the combination order-independent and in range
+    hashes = row_hash.groupby([rows[by].rename('Group'), rows['Day']]).sum()
+    return hashes.map('{:016x}'.format).rename('Input_Hash').reset_index()
+
+
+def compute_indices(data, by='Industry_Tag', weighting='equal', window=VOL_WINDOW, start_index=None,
+                    history=None):
+    """
+    Aggregate ticker returns into one index per `by` group and day.
+    weighting='equal' averages returns; 'volume' weights each ticker by its traded value that day.
+    `start_index` (group -> last index level) and `history` (earlier rows of the same table)
+    let the result continue an existing series instead of starting at 1.0.
+    """
+    df = ticker_returns(data) if 'Return' not in data.columns or 'Day' not in data.columns else data
+    df = df.dropna(subset=['Return', by])
+    weight = df['Dollar_Volume'].fillna(0.0) if weighting == 'volume' else pd.Series(1.0, index=df.index)
+
+    grouped = pd.DataFrame({
+        'Day': df['Day'],
+        'Group': df[by],
+        'weighted': df['Return'] * weight,
+        'weight': weight,
+        'Tickers': 1,
+        'Dollar_Volume': df['Dollar_Volume'],
+    }).groupby(['Group', 'Day'], sort=True).sum()
+
+    agg = grouped.reset_index()
+    agg['Return'] = agg['weighted'] / agg['weight'].replace(0.0, np.nan)
+    agg = agg.drop(columns=['weighted', 'weight'])
+
+    base = agg['Group'].map(start_index or {}).fillna(1.0)
+    agg['Index'] = base * (1.0 + agg['Return'].fillna(0.0)).groupby(agg['Group']).cumprod()
+
+    # Rolling volatility needs the previous window of returns when extending a cache
+    returns = agg[['Group', 'Day', 'Return']]
+    if history is not None and not history.empty:
+        tail = history.groupby('Group').tail(window - 1)[['Group', 'Day', 'Return']]
+        returns = pd.concat([tail, returns], ignore_index=True).sort_values(['Group', 'Day'])
+    vol = returns.groupby('Group')['Return'].transform(lambda r: r.rolling(window, min_periods=2).std())
+    agg = agg.merge(returns.assign(Volatility=vol)[['Group', 'Day', 'Volatility']], on=['Group', 'Day'])
+    agg = agg.merge(group_day_hashes(df, by), on=['Group', 'Day'], how='left')
+    return agg[AGG_COLUMNS]
+
+
+def cache_path(by, weighting, source, cache_dir=CACHE_DIR):
+    """Cache file for one dimension and weighting, built from the input named `source`."""
+    return Path(cache_dir) / f"{source}_{by}_{weighting}.csv"
+
+
+def load_aggregates(by='Industry_Tag', weighting='equal', source='validated', cache_dir=CACHE_DIR):
+    """Load a cached aggregate table, or an empty one (also for caches from before input hashing)."""
+    path = cache_path(by, weighting, source, cache_dir)
+    if not path.exists():
+        return pd.DataFrame(columns=AGG_COLUMNS)
+    cached = pd.read_csv(path, parse_dates=['Day'], dtype={'Input_Hash': str})
+    if 'Input_Hash' not in cached.columns:
+        return pd.DataFrame(columns=AGG_COLUMNS)
+    return cached
+
+
+def first_changed_day(cached, df, by):
+    """
+    Earliest cached day whose input rows differ from `df`, or None.
+    The first day of `df` is not compared: its returns need a close that `df` no longer holds.
+    """
+    data_start = df['Day'].min()
+    last_day = cached['Day'].max()
+    current = group_day_hashes(df, by)
+    current = current[(current['Day'] > data_start) & (current['Day'] <= last_day)]
+    old = cached.loc[cached['Day'] > data_start, ['Group', 'Day', 'Input_Hash']]
+    compared = old.merge(current, on=['Group', 'Day'], how='outer', suffixes=('_old', '_new'))
+    changed = compared[compared['Input_Hash_old'] != compared['Input_Hash_new']]
+    return changed['Day'].min() if not changed.empty else None
+
+
+def update_aggregates(data, by='Industry_Tag', weighting='equal', source='validated', window=VOL_WINDOW,
+                      refresh=False, cache_dir=CACHE_DIR):
+    """
+    Bring the cached table for `source` up to date with `data`.
+    Days from the first one whose inputs changed onward are recomputed, as are days after the cache;
+    earlier days are reused. refresh=True rebuilds everything.
+    """
+    path = cache_path(by, weighting, source, cache_dir)
+    cached = pd.DataFrame(columns=AGG_COLUMNS) if refresh else load_aggregates(by, weighting, source, cache_dir)
+    df = ticker_returns(data)
+
+    if cached.empty:
+        agg = compute_indices(df, by, weighting, window)
+    else:
+        recompute_from = first_changed_day(cached, df, by)
+        if recompute_from is None:
+            if not (df['Day'] > cached['Day'].max()).any():
+                return cached
+            keep = cached
+            rows = df[df['Day'] > cached['Day'].max()]
+        else:
+            print(f"Aggregates for {by} changed from {recompute_from.date()}, recomputing from there")
+            keep = cached[cached['Day'] < recompute_from]
+            rows = df[df['Day'] >= recompute_from]
+        # Returns were computed on the full frame, so the first recomputed day still sees its previous close
+        last_index = keep.sort_values('Day').groupby('Group')['Index'].last().to_dict()
+        new_agg = compute_indices(rows, by, weighting, window, start_index=last_index, history=keep)
+        agg = pd.concat([keep, new_agg], ignore_index=True)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    agg.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return agg
+
+
+def update_all(data, source='validated', refresh=False):
+    """Update every dimension x weighting table for `source`; returns {(by, weighting): table}."""
+    return {(by, weighting): update_aggregates(data, by, weighting, source, refresh=refresh)
+            for by in DIMENSIONS if by in data.columns for weighting in WEIGHTINGS}
+
+
+def add_aggregate_features(data, aggregates, by='Industry_Tag', weighting='equal'):
+    """Join each row's group return and volatility as `{by}_Return` / `{by}_Volatility` columns."""
+    table = aggregates[['Group', 'Day', 'Return', 'Volatility']].rename(columns={
+        'Group': by, 'Return': f'{by}_Return', 'Volatility': f'{by}_Volatility'})
+    data = data.copy()
+    data['Day'] = trading_day(data['Date'])
+    return data.merge(table, on=[by, 'Day'], how='left').drop(columns='Day')
@@ -6,6 +6,9 @@ import numpy as np
 import pandas as pd
 import os
 
+from src.data.aggregates import VOL_WINDOW, update_aggregates
+from src.data.API.pipeline import training_data_path
+
 # Increase default figure and font sizes for readability
 plt.rcParams.update({
     'figure.figsize': (16, 9),
@@ -213,9 +216,11 @@ def plot_correlation_clustermap(data):
     plt.savefig(output_dir / 'correlation_clustermap.png', bbox_inches='tight')
     plt.close()
 
-def plot_industry_pie(data):
-    print("Plotting industry distribution pie chart...")
-    counts = data['Industry_Tag'].value_counts()
+def plot_industry_pie(aggregates, days=180):
+    print("Plotting industry share of traded value pie chart...")
+    # Weighted by traded value (Close x Volume) from the aggregates, not by row counts
+    recent = aggregates[aggregates['Day'] >= aggregates['Day'].max() - pd.Timedelta(days=days)]
+    counts = recent.groupby('Group')['Dollar_Volume'].sum().sort_values(ascending=False)
     plt.figure(figsize=(16, 16))
     wedges, texts, autotexts = plt.pie(
         counts.values,
@@ -230,16 +235,43 @@ def plot_industry_pie(data):
         t.set_weight('bold')
     for a in autotexts:
         a.set_fontsize(12)
-    plt.title('Industry Distribution (Last 180 Days)', fontsize=16, weight='bold')
+    plt.title(f'Industry Share of Traded Value (Last {days} Days)', fontsize=16, weight='bold')
     plt.tight_layout()
     plt.savefig(output_dir / 'industry_distribution_pie.png')
     plt.close()
 
 
-def main():
+def plot_group_indices(aggregates, label, days=180):
+    print(f"Plotting {label} indices...")
+    recent = aggregates[aggregates['Day'] >= aggregates['Day'].max() - pd.Timedelta(days=days)]
+    fig, (ax_index, ax_vol) = plt.subplots(2, 1, figsize=(18, 12), sharex=True)
+    for group, grp in recent.groupby('Group'):
+        # Rebase to the start of the window so groups are comparable
+        ax_index.plot(grp['Day'], grp['Index'] / grp['Index'].iloc[0], label=group)
+        ax_vol.plot(grp['Day'], grp['Volatility'], label=group)
+    ax_index.set_title(f'{label} Index (rebased)')
+    ax_index.set_ylabel('Index')
+    ax_vol.set_title(f'{label} Rolling Volatility ({VOL_WINDOW}-day)')
+    ax_vol.set_ylabel('Volatility')
+    ax_vol.set_xlabel('Date')
+    ax_index.legend(fontsize=8, ncol=2, loc='upper left')
+    plt.xticks(rotation=45)
+    fig.tight_layout()
+    fig.savefig(output_dir / f'{label.lower()}_indices.png')
+    plt.close(fig)
+
+
+def main(data_path=None, aggregates_source=None):
     print("=== Stock Market Analysis & Visualization (Last 180 Days) ===")
-    data = load_data('bin/data/stock_data.csv', days=180)
-    plot_industry_pie(data)
+    data_path = data_path or training_data_path()
+    data = load_data(data_path, days=180)
+    # Cached group indices, keyed by the data they come from and updated only where inputs changed
+    source = aggregates_source or Path(data_path).stem
+    industry = update_aggregates(data.reset_index(), 'Industry_Tag', 'volume', source)
+    country = update_aggregates(data.reset_index(), 'Country', 'volume', source)
+    plot_industry_pie(industry)
+    plot_group_indices(industry, 'Sector')
+    plot_group_indices(country, 'Country')
     """plot_historical_performance_per_stock(data)
     plot_facet_historical(data)
     chart_volatility_per_stock(data)
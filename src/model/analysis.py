@@ -1,5 +1,4 @@
 import os
-import glob
 from datetime import timedelta
 
 import pandas as pd
@@ -7,13 +6,14 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.preprocessing import MinMaxScaler
-from tensorflow.keras.models import load_model
 from tabulate import tabulate
 
+from src.data.API.pipeline import training_data_path
+from src.model.registry import load_index, resolve, load_artifacts
+from src.model.clustering import load_routing
+
 # Configuration
 LOOK_BACK = 60
-MODEL_DIR = "models"
-DATA_PATH = "bin/data/stock_data.csv"
 FIG_DIR = "results/figs"
 TABLE_DIR = "results"
 
@@ -33,31 +33,34 @@ plt.rcParams.update({
     'font.size': 16
 })
 
-def prepare_for_model(df):
+def prepare_for_model(df, look_back=LOOK_BACK, scaler=None):
     """
     Given a DataFrame for one ticker, return train/test sequences and scaler.
+    Pass the scaler saved with the model to reuse its training-split fit.
     """
     df = df.sort_values('Date').reset_index(drop=True)
-    scaler = MinMaxScaler()
-    scaled_close = scaler.fit_transform(df[['Close']].values)
+    if scaler is None:
+        scaler = MinMaxScaler()
+        scaler.fit(df[['Close']].values)
+    scaled_close = scaler.transform(df[['Close']].values)
 
     X, y = [], []
-    for i in range(LOOK_BACK, len(scaled_close)):
-        X.append(scaled_close[i-LOOK_BACK:i, 0])
+    for i in range(look_back, len(scaled_close)):
+        X.append(scaled_close[i-look_back:i, 0])
         y.append(scaled_close[i, 0])
-    X = np.array(X).reshape(-1, LOOK_BACK, 1)
+    X = np.array(X).reshape(-1, look_back, 1)
     y = np.array(y)
 
     split = int(0.8 * len(X))
-    return X[:split], X[split:], y[:split], y[split:], scaler, df['Date'].iloc[LOOK_BACK:].reset_index(drop=True)
+    return X[:split], X[split:], y[:split], y[split:], scaler, df['Date'].iloc[look_back:].reset_index(drop=True)
 
 
-def forecast_next_day(df, model, scaler):
+def forecast_next_day(df, model, scaler, look_back=LOOK_BACK):
     """
-    Forecast the next day's Close using the last LOOK_BACK window.
+    Forecast the next day's Close using the last `look_back` window.
     """
     scaled = scaler.transform(df[['Close']].values)
-    window = scaled[-LOOK_BACK:].reshape(1, LOOK_BACK, 1)
+    window = scaled[-look_back:].reshape(1, look_back, 1)
     pred = model.predict(window)
     return scaler.inverse_transform(pred)[0][0]
 
@@ -92,23 +95,37 @@ def plot_accuracy_direction(results_df, hist_df):
     plt.close(fig)
 
 
-def main():
-    # Load data
-    data = pd.read_csv(DATA_PATH, parse_dates=['Date'])
+def main(data_path=None):
+    # Load data (validated data when the DAG has produced it)
+    data = pd.read_csv(data_path or training_data_path(), parse_dates=['Date'])
 
     # Storage for metrics
     metrics = []
     mses = {}
 
-    # Loop over models
-    for model_file in glob.glob(os.path.join(MODEL_DIR, "lstm_*.h5")):
-        ticker = os.path.basename(model_file).split('_')[1].split('.')[0]
-        df_t = data[data['Ticker'] == ticker].copy()
-        if len(df_t) < LOOK_BACK * 2:
+    # Current models from the registry; routed tickers use their cluster's model unless overridden
+    index = load_index()
+    routing = load_routing()
+    loaded = {}
+    for ticker, df_t in data.groupby('Ticker'):
+        record = resolve(ticker, routing, index=index)
+        if record is None:
+            print(f"Warning: no current model for {ticker}, skipping")
+            continue
+        if record['path'] not in loaded:
+            loaded[record['path']] = load_artifacts(record)
+        model, scaler = loaded[record['path']]
+        if isinstance(scaler, dict):
+            if ticker not in scaler:
+                print(f"Warning: current model {record['name']} v{record['version']} was not trained on {ticker}, skipping")
+                continue
+            scaler = scaler[ticker]
+        look_back = record['params'].get('look_back', LOOK_BACK)
+        df_t = df_t.copy()
+        if len(df_t) < look_back * 2:
             continue
 
-        X_train, X_test, y_train, y_test, scaler, dates = prepare_for_model(df_t)
-        model = load_model(model_file)
+        X_train, X_test, y_train, y_test, scaler, dates = prepare_for_model(df_t, look_back, scaler)
 
         train_preds = model.predict(X_train)
         test_preds = model.predict(X_test)
@@ -122,7 +139,7 @@ def main():
         mses[ticker] = mse_test
 
         next_date = df_t['Date'].max() + timedelta(days=1)
-        next_pred = forecast_next_day(df_t, model, scaler)
+        next_pred = forecast_next_day(df_t, model, scaler, look_back)
 
         metrics.append({
             'Ticker': ticker,
@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
+
+from src.data.aggregates import trading_day
+from src.data.API.pipeline import training_data_path
+from src.model.train_lstm import train_cluster, register_result
+from src.model.tuning import load_best_params, tune_datasets
+
+# Configuration
+ROUTING_PATH = "models/routing.json"
+TRAIN_FRACTION = 0.8    # Features use only the training period, matching the model split
+MAX_DISTANCE = 0.5      # Clusters merge (average linkage) until this distance
+WEIGHTS = {'correlation': 0.6, 'sector': 0.25, 'volatility': 0.15}
+
+
+def ticker_features(data, train_fraction=TRAIN_FRACTION):
+    """
+    Return correlation of daily returns, volatility and sector per ticker,
+    computed on the first `train_fraction` of dates so no test-period information is used.
+    """
+    data = data.copy()
+    data['Date'] = trading_day(data['Date'])
+    dates = np.sort(data['Date'].unique())
+    cutoff = dates[max(int(train_fraction * len(dates)) - 1, 0)]
+    train = data[data['Date'] <= cutoff]
+
+    closes = train.pivot_table(index='Date', columns='Ticker', values='Close')
+    returns = closes.pct_change(fill_method=None)
+    corr = returns.corr(min_periods=20).fillna(0.0)
+    volatility = returns.std()
+    sector = train.groupby('Ticker')['Industry_Tag'].agg(lambda s: s.mode().iat[0] if s.notna().any() else None)
+    return corr, volatility, sector.reindex(corr.index)
+
+
+def distance_matrix(corr, volatility, sector, weights=WEIGHTS):
+    """Blend correlation, sector and volatility distances into one matrix in [0, 1]."""
+    corr_dist = (1.0 - corr.values) / 2.0
+    # Integer codes compare element-wise on any pandas version (str-dtype arrays do not broadcast)
+    labels = pd.factorize(sector)[0]
+    sector_dist = (labels[:, None] != labels[None, :]).astype(float)
+    vol = volatility.reindex(corr.index).fillna(volatility.median()).values
+    vol_range = vol.max() - vol.min()
+    vol_dist = np.abs(vol[:, None] - vol[None, :]) / vol_range if vol_range > 0 else np.zeros_like(corr_dist)
+
+    dist = (weights['correlation'] * corr_dist + weights['sector'] * sector_dist
+            + weights['volatility'] * vol_dist)
+    np.fill_diagonal(dist, 0.0)
+    return dist
+
+
+def cluster_tickers(data, max_distance=MAX_DISTANCE):
+    """Cluster tickers hierarchically (average linkage, as in the correlation clustermap)."""
+    corr, volatility, sector = ticker_features(data)
+    tickers = list(corr.index)
+    if len(tickers) < 2:
+        labels = [1] * len(tickers)
+    else:
+        dist = distance_matrix(corr, volatility, sector)
+        labels = fcluster(linkage(squareform(dist, checks=False), method='average'),
+                          t=max_distance, criterion='distance')
+    groups = {}
+    for ticker, label in zip(tickers, labels):
+        groups.setdefault(label, []).append(ticker)
+    return {ticker: cluster_key(members) for members in groups.values() for ticker in members}
+
+
+def cluster_key(members):
+    """
+    Stable name for a cluster, derived from its sorted members, so the same key always means
+    the same tickers (in the registry, tuning results and routing table) across re-clustering.
+    """
+    digest = hashlib.sha1("\n".join(sorted(members)).encode()).hexdigest()[:10]
+    return f"cluster_{digest}"
+
+
+def load_routing(path=ROUTING_PATH):
+    """Load the ticker -> cluster model routing table."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_routing(routing, path=ROUTING_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(routing, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def cluster_members(routing):
+    """Invert the routing table into cluster -> sorted list of tickers."""
+    members = {}
+    for ticker, key in routing.items():
+        members.setdefault(key, []).append(ticker)
+    return {key: sorted(tickers) for key, tickers in sorted(members.items())}
+
+
+def train_clusters(data, routing, tune=True):
+    """Train and register one model per cluster of `routing`, tuning clusters never seen before when `tune`."""
+    members = cluster_members(routing)
+    datasets = {key: data[data['Ticker'].isin(tickers)].copy() for key, tickers in members.items()}
+    if tune:
+        # Keys encode membership, so only clusters never seen before are searched
+        tune_datasets(datasets)
+    best_params = load_best_params()
+
+    with ProcessPoolExecutor() as executor:
+        tasks = [executor.submit(train_cluster, cluster_data, key, best_params.get(key, {}).get('params'))
+                 for key, cluster_data in datasets.items()]
+        for future in tasks:
+            result, record = future.result()
+            print("\n" + result)
+            if record is not None:
+                print(register_result(record))
+
+
+def run(tune=True, data_path=None):
+    """Cluster tickers, save the routing table and train one model per cluster."""
+    data = pd.read_csv(data_path or training_data_path())
+    routing = cluster_tickers(data)
+    save_routing(routing)
+    print(f"✓ {len(routing)} tickers grouped into {len(cluster_members(routing))} clusters, "
+          f"routing saved to {ROUTING_PATH}")
+    train_clusters(data, routing, tune)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,236 @@
+import os
+import json
+import uuid
+import pickle
+import shutil
+from datetime import datetime
+from urllib.parse import quote
+
+"""
+Model registry: one JSON index mapping each model name (a ticker or a cluster key)
+to its versions and the promoted "current" version.
+
+Artifacts are written to a staging directory and renamed into place, and the index
+is replaced atomically, so a crashed run never leaves a half-written model behind.
+Workers only call `save_artifacts`; the parent process owns the index and calls
+`register` / `promote`, so concurrent training never races on it.
+"""
+
+# Configuration
+MODEL_DIR = "models"
+INDEX_PATH = os.path.join(MODEL_DIR, "registry.json")
+MODEL_FILE = "model.h5"
+SCALER_FILE = "scaler.pkl"
+KEEP_VERSIONS = 2  # Newest non-current versions whose artifacts `prune` keeps for manual promotion
+
+
+def _atomic_write_json(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def load_index(path=INDEX_PATH):
+    """Load the registry index ({'models': {name: {'current': .., 'versions': {..}}}})."""
+    if not os.path.exists(path):
+        return {'models': {}}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_artifacts(name, model, scaler, model_dir=MODEL_DIR):
+    """
+    Save a trained model and its scaler(s) under a fresh artifact directory.
+    Safe to call from worker processes; returns the directory to pass to `register`.
+    """
+    # Names are quoted rather than parsed back, so tickers with '.', '_' or '/' are fine
+    base = os.path.join(model_dir, quote(name, safe=''))
+    artifact_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(base, f".staging-{artifact_id}")
+    os.makedirs(staging)
+    try:
+        model.save(os.path.join(staging, MODEL_FILE))
+        with open(os.path.join(staging, SCALER_FILE), 'wb') as file:
+            pickle.dump(scaler, file)
+        final = os.path.join(base, artifact_id)
+        os.replace(staging, final)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return final
+
+
+def register(name, artifact_dir, params=None, metrics=None, data_range=None, members=None, path=INDEX_PATH):
+    """Record a saved artifact as the next version of `name`. Does not promote it."""
+    index = load_index(path)
+    entry = index['models'].setdefault(name, {'current': None, 'versions': {}})
+    version = max((int(v) for v in entry['versions']), default=0) + 1
+    entry['versions'][str(version)] = {
+        'path': artifact_dir,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'params': params or {},
+        'metrics': metrics or {},
+        'data_range': data_range or {},
+        'members': members,  # Tickers a cluster model serves; None for single-ticker models
+    }
+    _atomic_write_json(index, path)
+    return version
+
+
+def promote(name, version, path=INDEX_PATH, override=False):
+    """
+    Make `version` the current model for `name`.
+    override=True marks a ticker's own model as serving it even when the ticker is routed to a cluster.
+    """
+    index = load_index(path)
+    entry = index['models'].get(name)
+    if entry is None or str(version) not in entry['versions']:
+        raise KeyError(f"No version {version} registered for {name}")
+    if entry['versions'][str(version)]['path'] is None:
+        raise KeyError(f"Version {version} of {name} was pruned")
+    entry['current'] = str(version)
+    if override:
+        entry['override'] = True
+    _atomic_write_json(index, path)
+
+
+def promote_latest(names=None, path=INDEX_PATH):
+    """Promote the newest version of every model in `names` (default: all) in one index write; returns those changed."""
+    index = load_index(path)
+    changed = []
+    for name, entry in index['models'].items():
+        if names and name not in names:
+            continue
+        latest = str(max(int(v) for v in entry['versions']))
+        if entry['current'] != latest:
+            entry['current'] = latest
+            changed.append(name)
+    if changed:
+        _atomic_write_json(index, path)
+    return changed
+
+
+def prune(names=None, keep=KEEP_VERSIONS, path=INDEX_PATH):
+    """
+    Delete the artifact directories of versions of `names` (default: all) that are neither current
+    nor among the `keep` newest others. Their index records stay, marked pruned, as history.
+    Returns the number of directories removed.
+    """
+    index = load_index(path)
+    removed = 0
+    for name, entry in index['models'].items():
+        if names and name not in names:
+            continue
+        others = [v for v in sorted(entry['versions'], key=int, reverse=True) if v != entry['current']]
+        for version in others[keep:]:
+            record = entry['versions'][version]
+            if record['path'] is None:
+                continue
+            shutil.rmtree(record['path'], ignore_errors=True)
+            record['path'] = None
+            removed += 1
+    if removed:
+        _atomic_write_json(index, path)
+    return removed
+
+
+def comparable(record, current):
+    """Whether two versions were trained and tested on the same data and look-back, so their metrics compare."""
+    return (record.get('data_range') == current.get('data_range')
+            and (record.get('params') or {}).get('look_back') == (current.get('params') or {}).get('look_back')
+            and record.get('members') == current.get('members'))
+
+
+def register_and_maybe_promote(name, artifact_dir, metric='mse', path=INDEX_PATH, **record):
+    """
+    Register a new version and promote it automatically when there is no current version, or when
+    it scores at least as well on `metric` as the current one on the same test data. That is the
+    current model's score on the new test split (`metrics['baseline']`, see train_lstm.score_current)
+    when training provided one, else its own score if the versions are `comparable`.
+    Anything else is left to an explicit `promote`.
+    """
+    version = register(name, artifact_dir, path=path, **record)
+    current = get_current(name, path=path)
+    if current is None:
+        promote(name, version, path=path)
+        return version, True
+    metrics = record.get('metrics') or {}
+    baseline = metrics.get('baseline') or {}
+    if baseline.get('version') == current['version']:
+        old_score = baseline.get(metric)
+    elif comparable(record, current):
+        old_score = current['metrics'].get(metric)
+    else:
+        return version, False
+    new_score = metrics.get(metric)
+    if new_score is not None and (old_score is None or new_score <= old_score):
+        promote(name, version, path=path)
+        return version, True
+    return version, False
+
+
+def get_current(name, path=INDEX_PATH, index=None):
+    """Return the current version record of `name`, or None."""
+    index = index or load_index(path)
+    entry = index['models'].get(name)
+    if entry is None or entry['current'] is None:
+        return None
+    return {'name': name, 'version': entry['current'], **entry['versions'][entry['current']]}
+
+
+def resolve(ticker, routing=None, path=INDEX_PATH, index=None):
+    """
+    Return the current record serving `ticker`. The routing table is authoritative: a routed ticker
+    is served by its cluster's model unless its own model was explicitly promoted as an override.
+    Unrouted tickers, and routed ones whose cluster has no current model, use their own model.
+    """
+    index = index or load_index(path)
+    own = get_current(ticker, index=index)
+    overridden = index['models'].get(ticker, {}).get('override', False)
+    if routing and ticker in routing and not (own and overridden):
+        cluster = get_current(routing[ticker], index=index)
+        if cluster is not None:
+            return cluster
+    return own
+
+
+def load_artifacts(record):
+    """Load (model, scaler) for a registry record; cluster records hold a ticker -> scaler dict."""
+    from tensorflow.keras.models import load_model
+
+    model = load_model(os.path.join(record['path'], MODEL_FILE))
+    with open(os.path.join(record['path'], SCALER_FILE), 'rb') as file:
+        scaler = pickle.load(file)
+    return model, scaler
+
+
+def main(argv):
+    """
+    `list` prints current versions; `promote NAME VERSION` promotes explicitly
+    (for a routed ticker this also makes its own model override its cluster's);
+    `promote --latest [NAME ...]` promotes the newest version of the given (default: all) models;
+    `prune [NAME ...]` deletes artifacts of old unpromoted versions.
+    """
+    if argv[:2] == ['promote', '--latest']:
+        changed = promote_latest(argv[2:] or None)
+        print(f"✓ Promoted the latest version of {len(changed)} models")
+        return
+    if len(argv) == 3 and argv[0] == 'promote':
+        promote(argv[1], argv[2], override=True)
+        print(f"✓ {argv[1]} v{argv[2]} is now current")
+        return
+    if argv[:1] == ['prune']:
+        print(f"✓ Removed {prune(argv[1:] or None)} old artifact directories")
+        return
+    for name, entry in sorted(load_index()['models'].items()):
+        current = entry['current']
+        metrics = entry['versions'][current]['metrics'] if current else {}
+        pinned = " (override)" if entry.get('override') else ""
+        print(f"{name}: current v{current} of {len(entry['versions'])}, mse {metrics.get('mse')}{pinned}")
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
@@ -3,25 +3,42 @@ import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 import tensorflow as tf
 from keras.models import Sequential
-from keras.layers import LSTM, Dense, Dropout
+from keras.layers import LSTM, Dense, Dropout, Input
+from keras.optimizers import Adam
 import os
+import glob
+import pickle
+import shutil
+from urllib.parse import quote
 from concurrent.futures import ProcessPoolExecutor
+from src.data.API.pipeline import training_data_path
+from src.model.registry import save_artifacts, register_and_maybe_promote, get_current, load_artifacts, prune
 
-def build_model():
+# Used when no tuned configuration exists for a ticker (see tuning.py)
+DEFAULT_PARAMS = {
+    'look_back': 60,
+    'units': 50,
+    'layers': 2,
+    'dropout': 0.2,
+    'learning_rate': 0.001,
+    'epochs': 50,
+}
+
+def build_model(look_back=60, units=50, layers=2, dropout=0.2, learning_rate=0.001, **_):
     model = Sequential()
-    model.add(LSTM(units=50, return_sequences=True, input_shape=(60, 1)))
-    model.add(Dropout(0.2))
-    model.add(LSTM(units=50, return_sequences=False))
-    model.add(Dropout(0.2))
+    model.add(Input(shape=(look_back, 1)))
+    for i in range(layers):
+        model.add(LSTM(units=units, return_sequences=i < layers - 1))
+        model.add(Dropout(dropout))
     model.add(Dense(units=1))
-    model.compile(optimizer='adam', loss='huber')
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='huber')
     return model
 
-def prepare_for_model(data):
+def prepare_for_model(data, look_back=60):
     # Create sequences first
     X, y = [], []
-    for i in range(60, len(data)):
-        X.append(data[['Close']].values[i-60:i, 0])
+    for i in range(look_back, len(data)):
+        X.append(data[['Close']].values[i-look_back:i, 0])
         y.append(data[['Close']].values[i, 0])
     X, y = np.array(X), np.array(y)
     X = X.reshape((X.shape[0], X.shape[1], 1))
@@ -40,47 +57,224 @@ def prepare_for_model(data):
 
     return X_train, X_test, y_train, y_test, scaler
 
-def train_single_stock(stock_data, ticker):
+def prepare_pooled(data, look_back=60):
+    """
+    Stack the windows of several tickers into one dataset for a shared model.
+    Each ticker is scaled with its own scaler, fit on its own training split.
+    """
+    parts, scalers = [], {}
+    for ticker, group in data.groupby('Ticker'):
+        group = group.sort_values('Date')
+        if len(group) < 2 * look_back:
+            continue
+        X_train, X_test, y_train, y_test, scaler = prepare_for_model(group, look_back)
+        parts.append((ticker, X_train, X_test, y_train, y_test))
+        scalers[ticker] = scaler
+    if not parts:
+        return None
+
+    X_train = np.concatenate([p[1] for p in parts])
+    X_test = np.concatenate([p[2] for p in parts])
+    y_train = np.concatenate([p[3] for p in parts])
+    y_test = np.concatenate([p[4] for p in parts])
+    test_tickers = np.concatenate([np.full(len(p[2]), p[0], dtype=object) for p in parts])
+    return X_train, X_test, y_train, y_test, scalers, test_tickers
+
+def prepare_pooled_validation(data, look_back=60, validation_fraction=0.2):
+    """
+    Fit/validation windows for tuning: every ticker's training windows are split in time
+    (last `validation_fraction` held out) before pooling, so each ticker is both trained on
+    and validated on, and the test split is never touched.
+    """
+    X_fit, X_val, y_fit, y_val = [], [], [], []
+    for _, group in data.groupby('Ticker'):
+        group = group.sort_values('Date')
+        if len(group) < 2 * look_back:
+            continue
+        X_train, _, y_train, _, _ = prepare_for_model(group, look_back)
+        split = int((1 - validation_fraction) * len(X_train))
+        if split == 0 or split == len(X_train):
+            continue
+        X_fit.append(X_train[:split])
+        X_val.append(X_train[split:])
+        y_fit.append(y_train[:split])
+        y_val.append(y_train[split:])
+    if not X_fit:
+        return None
+    return np.concatenate(X_fit), np.concatenate(X_val), np.concatenate(y_fit), np.concatenate(y_val)
+
+def data_range(data):
+    """First and last date of the data a model was trained on, for the registry."""
+    dates = pd.to_datetime(data['Date'], utc=True)
+    return {'start': str(dates.min().date()), 'end': str(dates.max().date()), 'rows': int(len(data))}
+
+def score_current(name, X_test, y_test, scalers, look_back, test_tickers=None):
+    """
+    MSE of the current registered model of `name` on a new version's test windows, so the registry can
+    compare both on the same data. Windows are mapped back to prices and rescaled with the current model's
+    own scaler(s). `scalers` is one scaler, or ticker -> scaler with `test_tickers` for a cluster.
+    Returns {'version', 'mse'}, or None when the current model cannot be scored on these windows.
+    """
+    record = get_current(name)
+    if record is None or record['params'].get('look_back') != look_back:
+        return None
+    try:
+        model, current_scalers = load_artifacts(record)
+    except Exception as e:
+        print(f"Warning: could not load {name} v{record['version']} to compare against: {e}")
+        return None
+    if not isinstance(scalers, dict):
+        scalers, current_scalers = {name: scalers}, {name: current_scalers}
+        test_tickers = np.full(len(X_test), name, dtype=object)
+
+    mses = []
+    for ticker, scaler in scalers.items():
+        if ticker not in current_scalers:
+            return None
+        mask = test_tickers == ticker
+        prices = scaler.inverse_transform(X_test[mask].reshape(-1, 1))
+        X = current_scalers[ticker].transform(prices).reshape(X_test[mask].shape)
+        predictions_actual = current_scalers[ticker].inverse_transform(model.predict(X, verbose=0))
+        y_test_actual = scaler.inverse_transform(y_test[mask].reshape(-1, 1))
+        mses.append(np.mean((predictions_actual - y_test_actual) ** 2))
+    return {'version': record['version'], 'mse': float(np.mean(mses))}
+
+def fit_windows(ticker, windows, scaler, params, trained_range):
+    """Fit, evaluate and save one ticker's model from prepared windows; returns (report, registry record)."""
+    X_train, X_test, y_train, y_test = windows
+    model = build_model(**params)
+    model.fit(X_train, y_train, epochs=params['epochs'], batch_size=32, validation_data=(X_test, y_test), verbose=0)
+
+    predictions = model.predict(X_test)
+    predictions_actual = scaler.inverse_transform(predictions)
+    y_test_actual = scaler.inverse_transform(y_test.reshape(-1, 1))
+
+    mse = np.mean((predictions_actual - y_test_actual) ** 2)
+
+    baseline = score_current(ticker, X_test, y_test, scaler, params['look_back'])
+    artifact_dir = save_artifacts(ticker, model, scaler)
+    record = {'name': ticker, 'artifact_dir': artifact_dir, 'params': params,
+              'metrics': {'mse': float(mse), 'baseline': baseline}, 'data_range': trained_range}
+
+    results = [f"{ticker} MSE: {mse:.2f}"]
+    for i in range(min(5, len(predictions_actual))):
+        results.append(f"Predicted: {predictions_actual[i][0]:.2f}, Actual: {y_test_actual[i][0]:.2f}")
+    return "\n".join(results), record
+
+def train_single_stock(stock_data, ticker, params=None):
+    """Train one ticker's model and save its artifacts; returns (report, registry record or None)."""
     try:
+        params = {**DEFAULT_PARAMS, **(params or {})}
         stock_data = stock_data.sort_values('Date')
-        if len(stock_data) < 120:
-            return f"Skipping {ticker} (not enough data)"
+        if len(stock_data) < 2 * params['look_back']:
+            return f"Skipping {ticker} (not enough data)", None
+
+        X_train, X_test, y_train, y_test, scaler = prepare_for_model(stock_data, params['look_back'])
+        return fit_windows(ticker, (X_train, X_test, y_train, y_test), scaler, params, data_range(stock_data))
 
-        X_train, X_test, y_train, y_test, scaler = prepare_for_model(stock_data)
+    except Exception as e:
+        return f"Error training {ticker}: {e}", None
 
-        model = build_model()
-        model.fit(X_train, y_train, epochs=50, batch_size=32, validation_data=(X_test, y_test), verbose=0)
+def build_windows(data, best_params, out_dir):
+    """
+    Prepare every ticker's train/test windows (with its tuned look-back) and pickle them to `out_dir`,
+    one file per ticker, so training can start from ready arrays. The directory is swapped in whole.
+    """
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for ticker, stock_data in data.groupby('Ticker'):
+        params = {**DEFAULT_PARAMS, **(best_params.get(ticker, {}).get('params') or {})}
+        stock_data = stock_data.sort_values('Date')
+        if len(stock_data) < 2 * params['look_back']:
+            continue
+        X_train, X_test, y_train, y_test, scaler = prepare_for_model(stock_data, params['look_back'])
+        with open(os.path.join(tmp_dir, f"{quote(ticker, safe='')}.pkl"), 'wb') as file:
+            pickle.dump({'ticker': ticker, 'params': params, 'scaler': scaler,
+                         'windows': (X_train, X_test, y_train, y_test),
+                         'data_range': data_range(stock_data)}, file)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    print(f"✓ Windows for {len(os.listdir(out_dir))} tickers saved to {out_dir}")
 
-        predictions = model.predict(X_test)
-        predictions_actual = scaler.inverse_transform(predictions)
-        y_test_actual = scaler.inverse_transform(y_test.reshape(-1, 1))
+def train_from_windows(window_file):
+    """Train from a file written by build_windows; returns (report, registry record or None)."""
+    with open(window_file, 'rb') as file:
+        prepared = pickle.load(file)
+    ticker = prepared['ticker']
+    try:
+        return fit_windows(ticker, prepared['windows'], prepared['scaler'], prepared['params'], prepared['data_range'])
+    except Exception as e:
+        return f"Error training {ticker}: {e}", None
+
+def train_cluster(cluster_data, cluster_key, params=None):
+    """Train one shared model on the pooled windows of every ticker in a cluster; returns (report, record or None)."""
+    try:
+        params = {**DEFAULT_PARAMS, **(params or {})}
+        pooled = prepare_pooled(cluster_data, params['look_back'])
+        if pooled is None:
+            return f"Skipping {cluster_key} (not enough data)", None
+        X_train, X_test, y_train, y_test, scalers, test_tickers = pooled
 
-        mse = np.mean((predictions_actual - y_test_actual) ** 2)
+        model = build_model(**params)
+        model.fit(X_train, y_train, epochs=params['epochs'], batch_size=32, validation_data=(X_test, y_test), verbose=0)
+        predictions = model.predict(X_test)
 
-        os.makedirs("models", exist_ok=True)
-        model.save(f"models/lstm_{ticker}.h5")
+        results = [f"{cluster_key} ({len(scalers)} tickers)"]
+        mses = {}
+        for ticker, scaler in scalers.items():
+            mask = test_tickers == ticker
+            predictions_actual = scaler.inverse_transform(predictions[mask])
+            y_test_actual = scaler.inverse_transform(y_test[mask].reshape(-1, 1))
+            mses[ticker] = float(np.mean((predictions_actual - y_test_actual) ** 2))
+            results.append(f"  {ticker} MSE: {mses[ticker]:.2f}")
 
-        results = [f"{ticker} MSE: {mse:.2f}"]
-        for i in range(min(5, len(predictions_actual))):
-            results.append(f"Predicted: {predictions_actual[i][0]:.2f}, Actual: {y_test_actual[i][0]:.2f}")
-        return "\n".join(results)
+        baseline = score_current(cluster_key, X_test, y_test, scalers, params['look_back'], test_tickers)
+        artifact_dir = save_artifacts(cluster_key, model, scalers)
+        record = {'name': cluster_key, 'artifact_dir': artifact_dir, 'params': params,
+                  'metrics': {'mse': float(np.mean(list(mses.values()))), 'mse_by_ticker': mses,
+                              'baseline': baseline},
+                  'data_range': data_range(cluster_data), 'members': sorted(scalers)}
+        return "\n".join(results), record
 
     except Exception as e:
-        return f"Error training {ticker}: {e}"
+        return f"Error training {cluster_key}: {e}", None
+
+def register_result(record):
+    """
+    Register a worker's artifacts in the parent process, promoting them when the registry allows it,
+    and prune old unpromoted artifacts of the same model so they do not pile up.
+    """
+    name = record.pop('name')
+    version, promoted = register_and_maybe_promote(name, record.pop('artifact_dir'), **record)
+    prune([name])
+    if promoted:
+        return f"Registered {name} v{version} (promoted to current)"
+    return (f"Registered {name} v{version} (current kept; not comparable or not better, "
+            f"promote with: python -m src.model.registry promote {name} {version})")
 
-def run():
-    data = pd.read_csv("bin/data/stock_data.csv")
-    tickers = data['Ticker'].unique()
+def run(data_path=None, windows_dir=None):
+    """Train every ticker, from prepared windows when `windows_dir` is given, otherwise from `data_path` (default: training_data_path())."""
+    from src.model.tuning import load_best_params
 
     tasks = []
     with ProcessPoolExecutor() as executor:
-        for ticker in tickers:
-            stock_data = data[data['Ticker'] == ticker].copy()
-            tasks.append(executor.submit(train_single_stock, stock_data, ticker))
+        if windows_dir is not None:
+            for window_file in sorted(glob.glob(os.path.join(windows_dir, "*.pkl"))):
+                tasks.append(executor.submit(train_from_windows, window_file))
+        else:
+            data = pd.read_csv(data_path or training_data_path())
+            best_params = load_best_params()
+            for ticker in data['Ticker'].unique():
+                stock_data = data[data['Ticker'] == ticker].copy()
+                params = best_params.get(ticker, {}).get('params')
+                tasks.append(executor.submit(train_single_stock, stock_data, ticker, params))
 
         for future in tasks:
-            result = future.result()
+            result, record = future.result()
             print("\n" + result)
+            if record is not None:
+                print(register_result(record))
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
@@ -0,0 +1,177 @@
+import os
+import json
+import math
+import random
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from src.data.API.pipeline import training_data_path
+from src.model.train_lstm import DEFAULT_PARAMS, build_model, prepare_pooled_validation
+
+# Configuration
+BEST_PARAMS_PATH = "models/best_params.json"
+SEARCH_SPACE = {
+    'look_back': [20, 40, 60, 90],
+    'units': [32, 50, 64, 128],
+    'layers': [1, 2, 3],
+    'learning_rate': [0.0003, 0.001, 0.003],
+}
+N_CONFIGS = 27      # Configurations sampled per ticker
+MIN_EPOCHS = 5      # Epoch budget of the first halving round
+MAX_EPOCHS = 100    # No rung trains longer than this
+ETA = 3             # Keep the best 1/ETA of configurations each round
+CPU_BUDGET = os.cpu_count() or 1  # Worker processes shared by every ticker being tuned
+
+
+def max_look_back(data):
+    """Longest look-back every ticker in `data` can train and validate with (windows need 2 x look_back rows)."""
+    return int(data.groupby('Ticker').size().min()) // 2
+
+
+def sample_configs(n, seed=0, max_look_back=None):
+    """
+    Sample `n` distinct configurations from SEARCH_SPACE (all of them if the grid is smaller),
+    leaving out look-backs longer than `max_look_back` so no slot goes to a configuration the data cannot fit.
+    """
+    keys = list(SEARCH_SPACE)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+    if max_look_back is not None:
+        grid = [config for config in grid if config['look_back'] <= max_look_back]
+    random.Random(seed).shuffle(grid)
+    return grid[:n]
+
+
+def _init_worker():
+    # One TF thread pool per process so the pool size is the real CPU budget
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def evaluate_config(stock_data, key, config_id, params, epochs):
+    """
+    Train one configuration for up to `epochs` and return its best validation loss and the epoch reaching it.
+    Validation is the tail of each ticker's training split, so the test split stays unseen.
+    A cluster frame holding several tickers is tuned on their pooled windows.
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    pooled = prepare_pooled_validation(stock_data, params['look_back'])
+    if pooled is None:
+        return key, config_id, math.inf, epochs
+    X_fit, X_val, y_fit, y_val = pooled
+
+    model = build_model(**params)
+    history = model.fit(X_fit, y_fit, epochs=epochs, batch_size=32,
+                        validation_data=(X_val, y_val), verbose=0)
+    val_loss = history.history['val_loss']
+    best_epoch = min(range(len(val_loss)), key=val_loss.__getitem__) + 1
+    return key, config_id, float(val_loss[best_epoch - 1]), best_epoch
+
+
+def successive_halving(datasets, n_configs=N_CONFIGS, min_epochs=MIN_EPOCHS, max_epochs=MAX_EPOCHS,
+                       eta=ETA, cpu_budget=CPU_BUDGET, seed=0):
+    """
+    Tune every dataset (ticker or cluster -> DataFrame) with successive halving.
+    All rungs of all datasets share one process pool of `cpu_budget` workers;
+    after each rung only the best 1/eta configurations per dataset continue with eta x the epochs.
+    """
+    configs = {}
+    for key, data in datasets.items():
+        configs[key] = sample_configs(n_configs, seed, max_look_back(data))
+        if not configs[key]:
+            print(f"Skipping {key} (too little data for any look-back in {SEARCH_SPACE['look_back']})")
+    alive = {key: list(range(len(key_configs))) for key, key_configs in configs.items()}
+    scores = {key: {} for key in datasets}
+    epochs = min_epochs
+
+    with ProcessPoolExecutor(max_workers=cpu_budget, initializer=_init_worker) as executor:
+        while any(alive.values()) and epochs <= max_epochs:
+            print(f"Rung: {sum(map(len, alive.values()))} configurations at {epochs} epochs")
+            futures = [executor.submit(evaluate_config, datasets[key], key, cid, configs[key][cid], epochs)
+                       for key, ids in alive.items() for cid in ids]
+            rung = {key: {} for key in datasets}
+            for future in as_completed(futures):
+                try:
+                    key, cid, loss, best_epoch = future.result()
+                except Exception as e:
+                    print(f"Error evaluating configuration: {e}")
+                    continue
+                rung[key][cid] = (loss, best_epoch)
+
+            for key, ids in alive.items():
+                ranked = sorted(ids, key=lambda cid: rung[key].get(cid, (math.inf,))[0])
+                for cid in ranked:
+                    loss, best_epoch = rung[key].get(cid, (math.inf, epochs))
+                    scores[key][cid] = (loss, epochs, best_epoch)
+                keep = len(ranked) // eta
+                alive[key] = [cid for cid in ranked[:keep] if math.isfinite(scores[key][cid][0])]
+            epochs *= eta
+
+    best = {}
+    for key, key_scores in scores.items():
+        finite = {cid: s for cid, s in key_scores.items() if math.isfinite(s[0])}
+        if not finite:
+            continue
+        # Prefer configurations that survived the longest, then the lowest loss
+        cid, (loss, rung_epochs, best_epoch) = min(finite.items(), key=lambda item: (-item[1][1], item[1][0]))
+        best[key] = {
+            # The epoch count that reached the scored loss, so training reproduces what was scored
+            'params': {**configs[key][cid], 'epochs': best_epoch},
+            'val_loss': loss,
+            'tuned_at': datetime.now().isoformat(timespec='seconds'),
+        }
+    return best
+
+
+def load_best_params(path=BEST_PARAMS_PATH):
+    """Load persisted tuning results, keyed by ticker or cluster."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_best_params(results, path=BEST_PARAMS_PATH):
+    """Merge new results into the persisted file, replacing it atomically."""
+    merged = {**load_best_params(path), **results}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(merged, file, indent=2)
+    os.replace(tmp_path, path)
+    return merged
+
+
+def tune_datasets(datasets, retune=False):
+    """Tune and persist every dataset (ticker or cluster key -> DataFrame) lacking a stored configuration."""
+    existing = load_best_params()
+    datasets = {k: v for k, v in datasets.items() if retune or k not in existing}
+    if not datasets:
+        return {}
+    best = successive_halving(datasets)
+    for key, result in sorted(best.items()):
+        print(f"{key}: val_loss {result['val_loss']:.5f} with {result['params']}")
+    save_best_params(best)
+    print(f"✓ Best configurations saved to {BEST_PARAMS_PATH}")
+    return best
+
+
+def run(tickers=None, retune=False, data_path=None):
+    """Tune the given tickers (default: all that have no stored configuration yet)."""
+    data = pd.read_csv(data_path or training_data_path())
+    existing = load_best_params()
+    if tickers is None:
+        tickers = [t for t in data['Ticker'].unique() if retune or t not in existing]
+    if not len(tickers):
+        print("✓ All tickers already tuned")
+        return existing
+
+    datasets = {t: data[data['Ticker'] == t].copy() for t in tickers}
+    return tune_datasets(datasets, retune=True)
+
+
+if __name__ == "__main__":
+    run()